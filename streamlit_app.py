@@ -1,22 +1,26 @@
 import streamlit as st
 import json
 import datetime
-import base64
 import io
 import os
 import re
 import asyncio
+import codecs
+import functools
 import hashlib
+import heapq
 import threading
 import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from typing import Dict, List, Tuple, Any, Optional
 from dataclasses import dataclass
 from enum import Enum
 
 # Third-party imports (if available)
 try:
-    from reportlab.pdfgen import canvas
-    from reportlab.lib.pagesizes import letter, A4
+    from reportlab.lib.pagesizes import A4
     from reportlab.lib.colors import HexColor
     from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
@@ -26,7 +30,6 @@ except ImportError:
     st.stop()
 
 try:
-    import openai
     from openai import OpenAI
     OPENAI_AVAILABLE = True
 except ImportError:
@@ -83,24 +86,36 @@ class ComplianceViolation:
     penalty_risk: str
 
 # OpenAI Configuration (REQUIRED)
-@st.cache_resource
 def get_openai_client():
     """Initializes OpenAI client - REQUIRED"""
     if not OPENAI_AVAILABLE:
         st.error("❌ OpenAI is required for enterprise analysis!")
         st.stop()
 
+    # The key is re-read on every call, so a rotated OPENAI_API_KEY is picked
+    # up; the client and its API test are cached per key in connect_openai
     try:
         # First try Streamlit secrets
         if "OPENAI_API_KEY" in st.secrets:
-            client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+            api_key = st.secrets["OPENAI_API_KEY"]
         # Then try environment variable
         elif "OPENAI_API_KEY" in os.environ:
-            client = OpenAI(api_key=os.environ["OPENAI_API_KEY"])
+            api_key = os.environ["OPENAI_API_KEY"]
         else:
             st.error("❌ Configure OPENAI_API_KEY in Streamlit Secrets or as an environment variable!")
             st.info("Go to Settings > Secrets and add: OPENAI_API_KEY = 'your-key-here'")
             st.stop()
+    except Exception as e:
+        st.error(f"❌ OpenAI configuration error: {str(e)}")
+        st.stop()
+
+    return connect_openai(api_key)
+
+@st.cache_resource(max_entries=1, show_spinner=False)
+def connect_openai(api_key: str):
+    """Builds and tests the client for one API key; a new key replaces the cached one"""
+    try:
+        client = OpenAI(api_key=api_key)
 
         # Mandatory API test
         # Note: This test might not be robust enough for all scenarios
@@ -123,8 +138,8 @@ def get_openai_client():
         st.error(f"❌ OpenAI configuration error: {str(e)}")
         st.stop()
 
-# Enterprise CSS
-st.markdown("""
+# Enterprise CSS, emitted from main() on every run (Streamlit drops elements a rerun does not re-send)
+ENTERPRISE_CSS = """
 <style>
 .enterprise-header {
     background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
@@ -215,7 +230,7 @@ st.markdown("""
     font-family: 'Courier New', monospace;
 }
 </style>
-""", unsafe_allow_html=True)
+"""
 
 # Detailed Enterprise Risks (based on IBM report)
 ENTERPRISE_AGENTIC_RISKS = {
@@ -311,6 +326,20 @@ ENTERPRISE_AGENTIC_RISKS = {
     }
 }
 
+def _build_risk_term_index() -> Dict[str, List[Tuple[str, bool]]]:
+    """Inverts ENTERPRISE_AGENTIC_RISKS into term -> [(risk_id, is_severity_indicator)]"""
+    index = {}
+    for risk_id, risk_info in ENTERPRISE_AGENTIC_RISKS.items():
+        for term in risk_info["technical_patterns"]:
+            index.setdefault(term, []).append((risk_id, False))
+        for term in risk_info["severity_indicators"]:
+            index.setdefault(term, []).append((risk_id, True))
+    return index
+
+# Every distinct technical pattern / severity indicator is scanned once per file
+# and its hit credited to all risks that list it
+RISK_TERM_INDEX = _build_risk_term_index()
+
 # Detailed Compliance Frameworks
 COMPLIANCE_REQUIREMENTS = {
     ComplianceFramework.EU_AI_ACT: {
@@ -393,12 +422,113 @@ COMPLIANCE_REQUIREMENTS = {
     }
 }
 
+# Maps control bytes (other than tab/newline/carriage return) to 1, the rest to 0
+BINARY_BYTES_TABLE = bytes(1 if b < 32 and b not in (9, 10, 13) else 0 for b in range(256))
+MAX_BINARY_RATIO = 0.3
+TEXT_SNIFF_BYTES = 16 * 1024  # Only the head of an upload is checked for binary content
+# Uploads larger than this are skipped, not analyzed, to bound memory use and
+# scan time (the lexical scan, line count and hashing read the whole file)
+MAX_FILE_BYTES = 2 * 1024 * 1024
+# UTF-32 marks are checked before UTF-16, whose little-endian BOM is a prefix of UTF-32-LE's
+TEXT_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+
+# Enterprise score component weights: files, system, compliance (highest), architecture
+ENTERPRISE_SCORE_WEIGHTS = (0.25, 0.25, 0.35, 0.15)
+
+# Blocking OpenAI calls run on this bounded pool so files can be analyzed concurrently
+MAX_CONCURRENT_AI_CALLS = 8
+AI_CALL_EXECUTOR = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_AI_CALLS, thread_name_prefix="agentrisk-ai")
+RISK_ANALYSIS_TOKENS_PER_RISK = 500  # Output budget per risk in the combined request (as the former per-risk calls)
+
+# Per-file analysis results are reused for identical content within this window;
+# the least recently used entries are evicted beyond MAX_ANALYSIS_CACHE_ENTRIES
+ANALYSIS_CACHE_TTL = 24 * 60 * 60
+MAX_ANALYSIS_CACHE_ENTRIES = 256
+
+# Dependency extraction patterns, compiled once. Each regex is paired with a
+# literal it cannot match without, used as a cheap prefilter.
+IMPORT_PATTERNS = (
+    ("import", re.compile(r"import\s+(\w+)", re.IGNORECASE)),
+    ("import", re.compile(r"from\s+(\w+)\s+import", re.IGNORECASE)),
+    ("require", re.compile(r"require\s*\(['\"]([^'\"]+)['\"]\)", re.IGNORECASE)),
+    ("@import", re.compile(r"@import\s+['\"]([^'\"]+)['\"]", re.IGNORECASE)),
+)
+
+# Score display lookups (higher score = lower risk). Indexed by the number of
+# thresholds a score clears, so callers do one sum + one tuple index.
+SCORE_BADGE_THRESHOLDS = (40, 65, 80)
+SCORE_BADGES = ("🔴", "🟠", "🟡", "🟢")  # High/Critical, Moderate, Low, Minimal
+
+COMPLIANCE_STATUS_THRESHOLDS = (60, 80)
+COMPLIANCE_STATUSES = ("❌ Non-Compliant", "⚠️ Warning", "✅ Compliant")
+
+# Remediation timeline per violation severity, and its urgency marker in the UI
+REMEDIATION_TIMELINES = {RiskLevel.CRITICAL: "Immediate", RiskLevel.HIGH: "Short Term", RiskLevel.MEDIUM: "Medium Term"}
+DEFAULT_REMEDIATION_TIMELINE = "Long Term"
+TIMELINE_EMOJIS = {"Immediate": "🔴", "Short Term": "🟡"}
+DEFAULT_TIMELINE_EMOJI = "🟢"
+
+FILE_TYPES = {
+    'py': 'Python', 'js': 'JavaScript', 'ts': 'TypeScript',
+    'java': 'Java', 'cs': 'C#', 'php': 'PHP', 'rb': 'Ruby',
+    'go': 'Go', 'cpp': 'C++', 'c': 'C', 'json': 'JSON',
+    'yaml': 'YAML', 'yml': 'YAML', 'xml': 'XML',
+    'sql': 'SQL', 'md': 'Markdown', 'txt': 'Text',
+    'html': 'HTML', 'css': 'CSS', 'scss': 'SCSS'
+}
+
+FILE_DETAILS_PAGE_SIZE = 25  # Files rendered per page in the detailed results view
+
+# Heading colour for each risk in the PDF report; anything below HIGH uses the default
+PDF_RISK_COLORS = {RiskLevel.CRITICAL: '#7f1d1d', RiskLevel.HIGH: '#dc2626'}
+PDF_DEFAULT_RISK_COLOR = '#f59e0b'
+
+def file_extension(filename: str) -> str:
+    """Returns the lowercase extension without the dot ('' if none, as os.path.splitext)"""
+    stem, dot, ext = filename.rpartition('.')
+    return ext.lower() if dot and stem.strip('.') else ''
+
+def classify_filename(filename: str) -> Tuple[str, str]:
+    """Returns (extension, file type) for a filename"""
+    ext = file_extension(filename)
+    return ext, FILE_TYPES.get(ext, 'Unknown')
+
+def score_badge(score: float) -> str:
+    """Returns the sidebar emoji for an enterprise score"""
+    low, mid, high = SCORE_BADGE_THRESHOLDS
+    return SCORE_BADGES[(score >= low) + (score >= mid) + (score >= high)]
+
+def compliance_status(score: float) -> str:
+    """Returns the compliance status label for a framework score"""
+    warning, compliant = COMPLIANCE_STATUS_THRESHOLDS
+    return COMPLIANCE_STATUSES[(score >= warning) + (score >= compliant)]
+
+def select_top_risks(files_data: List[Dict], limit: int = 5) -> List[RiskAssessment]:
+    """Most urgent risks across all files: remediation priority first, then lowest score"""
+    # Higher score means LOWER risk; nsmallest matches sorted(...)[:limit] without a full sort
+    return heapq.nsmallest(limit,
+                           (risk for file_data in files_data for risk in file_data.get('risk_assessments', [])),
+                           key=lambda risk: (risk.remediation_priority, risk.score))
+
 class EnterpriseCodeAnalyzer:
     """Enterprise Analyzer with Mandatory AI"""
 
-    def __init__(self, openai_client: OpenAI):
-        self.client = openai_client
-        self.analysis_cache = {}
+    def __init__(self, openai_client: Optional[OpenAI] = None):
+        self._client = openai_client
+        # Shared by every session's analysis thread, hence the lock
+        self.analysis_cache = OrderedDict()
+        self.analysis_cache_lock = threading.Lock()
+
+    @property
+    def client(self) -> OpenAI:
+        """Fixed client if one was given, else the current one for the configured key"""
+        return self._client or get_openai_client()
 
     async def analyze_system_enterprise(self, uploaded_files) -> Dict:
         """Complete Enterprise Analysis"""
@@ -411,18 +541,36 @@ class EnterpriseCodeAnalyzer:
 
         progress_placeholder = st.empty()
 
+        # Uploads are read in order on the script thread; the per-file
+        # analyses then run concurrently (their AI calls share AI_CALL_EXECUTOR)
+        readable_files = []
         for i, uploaded_file in enumerate(uploaded_files):
-            progress_placeholder.text(f"📖 Analyzing {uploaded_file.name}... ({i+1}/{len(uploaded_files)})")
+            progress_placeholder.text(f"📖 Reading {uploaded_file.name}... ({i+1}/{len(uploaded_files)})")
+            content, file_bytes = self._read_file_content(uploaded_file)
+            if content:
+                readable_files.append((uploaded_file.name, content, file_bytes))
+
+        completed = 0
 
+        async def analyze_file(filename: str, content: str, file_bytes: bytes) -> Dict:
+            nonlocal completed
             try:
-                content = self._read_file_content(uploaded_file)
-                if content:
-                    file_analysis = await self._analyze_single_file_enterprise(uploaded_file.name, content)
-                    files_data.append(file_analysis)
-                    total_lines += file_analysis.get('lines_count', 0)
-            except Exception as e:
-                st.warning(f"⚠️ Error processing {uploaded_file.name}: {str(e)}")
+                return await self._analyze_single_file_enterprise(filename, content, file_bytes)
+            finally:
+                completed += 1
+                progress_placeholder.text(f"📖 Analyzing {filename}... ({completed}/{len(readable_files)})")
+
+        results = await asyncio.gather(*(analyze_file(*readable) for readable in readable_files),
+                                       return_exceptions=True)
+
+        for (filename, _, _), file_analysis in zip(readable_files, results):
+            if isinstance(file_analysis, BaseException):
+                if not isinstance(file_analysis, Exception):
+                    raise file_analysis  # Streamlit rerun/stop requests must reach the script runner
+                st.warning(f"⚠️ Error processing {filename}: {str(file_analysis)}")
                 continue
+            files_data.append(file_analysis)
+            total_lines += file_analysis.get('lines_count', 0)
 
         if not files_data:
             return {"error": "No valid files for analysis"}
@@ -445,7 +593,7 @@ class EnterpriseCodeAnalyzer:
 
         progress_placeholder.text("✅ Enterprise analysis completed!")
 
-        return {
+        analysis_result = {
             "analysis_type": "Enterprise AI-Powered Analysis",
             "files_analyzed": len(files_data),
             "total_lines": total_lines,
@@ -455,55 +603,108 @@ class EnterpriseCodeAnalyzer:
             "system_analysis": system_analysis,
             "compliance_analysis": compliance_analysis,
             "cross_analysis": cross_analysis,
+            "top_risks": select_top_risks(files_data),
             "analysis_date": datetime.datetime.now().isoformat(),
-            "analysis_hash": hashlib.md5(str(files_data).encode()).hexdigest()[:8],
             "ai_model_used": "gpt-4o-mini",
             "compliance_frameworks_checked": len(COMPLIANCE_REQUIREMENTS)
         }
-
-    def _read_file_content(self, uploaded_file) -> str:
-        """Reads file content with robust encoding"""
+        # Hash the whole result, date included: per-file results are memoized, so
+        # re-analyzing the same uploads repeats files_data but not the system-level
+        # analyses, and the hash keys the cached PDF report
+        analysis_result["analysis_hash"] = hashlib.md5(str(analysis_result).encode()).hexdigest()[:8]
+        return analysis_result
+
+    async def _chat_completion(self, prompt: str, max_tokens: int, temperature: float = 0.1,
+                               json_response: bool = False):
+        """Runs a blocking chat completion on the shared AI worker pool"""
+        options = {"response_format": {"type": "json_object"}} if json_response else {}
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(AI_CALL_EXECUTOR, functools.partial(
+            self.client.chat.completions.create,
+            model="gpt-4o-mini",
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=max_tokens,
+            temperature=temperature,
+            **options
+        ))
+
+    def _read_file_content(self, uploaded_file) -> Tuple[str, bytes]:
+        """Reads file content with robust encoding; also returns the raw bytes"""
         try:
+            # Oversized uploads (bundles, dumps, minified blobs) are rejected on size alone
+            if uploaded_file.size > MAX_FILE_BYTES:
+                st.warning(f"⚠️ Skipping {uploaded_file.name}: files larger than "
+                           f"{MAX_FILE_BYTES // (1024 * 1024)} MB are not analyzed")
+                return "", b""
+
+            # Sniff the head before pulling the whole upload into memory
             uploaded_file.seek(0)
-            content = uploaded_file.read()
+            head = uploaded_file.read(TEXT_SNIFF_BYTES)
 
-            # Try multiple encodings
-            for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-                try:
-                    return content.decode(encoding)
-                except UnicodeDecodeError:
-                    continue
+            # A byte-order mark names the encoding outright (and UTF-16/32 text
+            # would otherwise fail the control-byte check on its NULs)
+            bom_encoding = next((encoding for bom, encoding in TEXT_BOMS if head.startswith(bom)), None)
+            if bom_encoding is None and not self._is_text_content(head):
+                st.warning(f"⚠️ Skipping {uploaded_file.name}: binary content detected")
+                return "", head
+
+            uploaded_file.seek(0)
+            file_bytes = uploaded_file.read()
+
+            if bom_encoding:
+                return file_bytes.decode(bom_encoding, errors='replace'), file_bytes
 
-            # Fallback to binary analysis
-            return str(content)
+            # UTF-8 covers nearly every upload; latin-1 maps every byte, so it
+            # is the single, always-successful fallback decode
+            try:
+                return file_bytes.decode('utf-8'), file_bytes
+            except UnicodeDecodeError:
+                return file_bytes.decode('latin-1'), file_bytes
         except Exception as e:
             st.error(f"Critical error reading {uploaded_file.name}: {str(e)}")
-            return ""
-
-    async def _analyze_single_file_enterprise(self, filename: str, content: str) -> Dict:
-        """Enterprise analysis of individual file with AI"""
+            return "", b""
+
+    def _is_text_content(self, file_bytes: bytes) -> bool:
+        """Checks the control-byte ratio of raw bytes (single C-level pass)"""
+        if not file_bytes:
+            return True
+        if b'\x00' in file_bytes:  # NUL never appears in BOM-less text; memchr exits early
+            return False
+        binary_bytes = file_bytes.translate(BINARY_BYTES_TABLE).count(1)
+        return binary_bytes / len(file_bytes) <= MAX_BINARY_RATIO
+
+    async def _analyze_single_file_enterprise(self, filename: str, content: str, file_bytes: Optional[bytes] = None) -> Dict:
+        """Enterprise analysis of individual file with AI (memoized by content hash)"""
+
+        # Hash the raw upload when available instead of re-encoding the text
+        if file_bytes is None:
+            file_bytes = content.encode('utf-8', 'replace')
+        cache_key = (filename, hashlib.blake2b(file_bytes, digest_size=16).hexdigest())
+        cached = self._get_cached_analysis(cache_key)
+        if cached:
+            return cached
 
         # Basic information
-        lines = content.split('\n')
-        lines_count = len(lines)
+        lines_count = content.count('\n') + 1  # Same as len(content.split('\n')) without building the list
         char_count = len(content)
-        file_ext = os.path.splitext(filename.lower())[1][1:]
-
-        # Technical classification with AI
-        classification = await self._ai_classify_file(filename, content)
-
-        # Enterprise risk detection
-        risk_assessments = await self._detect_enterprise_risks(content, filename)
-
-        # Deep security analysis
-        security_analysis = await self._deep_security_analysis(content, filename)
+        _, file_type = classify_filename(filename)
+        content_lower = content.lower()  # Shared by the lexical detectors below
+
+        # Classification, risk detection, security analysis and insights are
+        # independent AI requests, so they run concurrently on AI_CALL_EXECUTOR
+        classification, risk_assessments, security_analysis, ai_insights = await asyncio.gather(
+            self._ai_classify_file(filename, content),
+            self._detect_enterprise_risks(content, filename, content_lower),
+            self._deep_security_analysis(content, filename),
+            self._ai_code_insights(content, filename)
+        )
 
         # File score
         file_score = self._calculate_file_enterprise_score(risk_assessments, security_analysis, content)
 
-        return {
+        file_analysis = {
             "filename": filename,
-            "file_type": self._get_file_type(file_ext),
+            "file_type": file_type,
             "classification": classification,
             "lines_count": lines_count,
             "char_count": char_count,
@@ -511,11 +712,49 @@ class EnterpriseCodeAnalyzer:
             "risk_level": self._get_enterprise_risk_level(file_score),
             "risk_assessments": risk_assessments,
             "security_analysis": security_analysis,
-            "content_preview": content[:1000] + "..." if len(content) > 1000 else content,
-            "critical_code_blocks": self._extract_critical_blocks(lines),
-            "ai_insights": await self._ai_code_insights(content, filename)
+            "content_preview": (content[:1000] + "...") if len(content) > 1000 else content,
+            "critical_code_blocks": self._extract_critical_blocks(content),
+            "ai_insights": ai_insights
         }
 
+        # Fallback results are not cached so a later run retries the AI
+        if not self._has_ai_fallback(file_analysis):
+            self._cache_analysis(cache_key, file_analysis)
+
+        return file_analysis
+
+    def _get_cached_analysis(self, cache_key: Tuple[str, str]) -> Optional[Dict]:
+        """Returns a fresh cached file analysis and marks it recently used"""
+        with self.analysis_cache_lock:
+            cached = self.analysis_cache.get(cache_key)
+            if not cached:
+                return None
+            if time.time() - cached[0] >= ANALYSIS_CACHE_TTL:
+                del self.analysis_cache[cache_key]
+                return None
+            self.analysis_cache.move_to_end(cache_key)
+            return cached[1]
+
+    def _cache_analysis(self, cache_key: Tuple[str, str], file_analysis: Dict):
+        """Stores a file analysis, dropping expired entries, then the least recently used"""
+        now = time.time()
+        with self.analysis_cache_lock:
+            expired = [key for key, (cached_at, _) in self.analysis_cache.items()
+                       if now - cached_at >= ANALYSIS_CACHE_TTL]
+            for key in expired:
+                del self.analysis_cache[key]
+            self.analysis_cache[cache_key] = (now, file_analysis)
+            self.analysis_cache.move_to_end(cache_key)
+            while len(self.analysis_cache) > MAX_ANALYSIS_CACHE_ENTRIES:
+                self.analysis_cache.popitem(last=False)
+
+    def _has_ai_fallback(self, file_analysis: Dict) -> bool:
+        """True if any AI step of a file analysis fell back to defaults"""
+        if "error" in file_analysis["classification"] or "error" in file_analysis["security_analysis"]:
+            return True
+        return any("error" in ra.technical_details for ra in file_analysis["risk_assessments"]
+                   if isinstance(ra.technical_details, dict))
+
     async def _ai_classify_file(self, filename: str, content: str) -> Dict:
         """Intelligent file classification with AI"""
 
@@ -536,12 +775,7 @@ class EnterpriseCodeAnalyzer:
         """
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=300,
-                temperature=0.1
-            )
+            response = await self._chat_completion(prompt, max_tokens=300, temperature=0.1)
 
             result = json.loads(response.choices[0].message.content)
             return result
@@ -557,32 +791,34 @@ class EnterpriseCodeAnalyzer:
                 "error": str(e)
             }
 
-    async def _detect_enterprise_risks(self, content: str, filename: str) -> List[RiskAssessment]:
+    async def _detect_enterprise_risks(self, content: str, filename: str, content_lower: Optional[str] = None) -> List[RiskAssessment]:
         """Enterprise risk detection with AI analysis"""
 
         risk_assessments = []
-        content_lower = content.lower()
-
-        for risk_id, risk_info in ENTERPRISE_AGENTIC_RISKS.items():
+        if content_lower is None:
+            content_lower = content.lower()
 
-            # Mandatory AI analysis
-            ai_analysis = await self._ai_risk_analysis(content, filename, risk_info)
+        # Single scan per distinct term, credited to risks via the inverted index
+        pattern_hits = {}
+        indicator_hits = {}
+        for term, risk_refs in RISK_TERM_INDEX.items():
+            if term in content_lower:
+                for ref_risk_id, is_indicator in risk_refs:
+                    (indicator_hits if is_indicator else pattern_hits).setdefault(ref_risk_id, []).append(term)
 
-            # Technical pattern detection
-            pattern_score = 0
-            evidence = []
+        # Mandatory AI analysis: all risks in one request that quotes the code once
+        ai_analyses = await self._ai_risk_analysis(content, filename)
 
-            for pattern in risk_info["technical_patterns"]:
-                if pattern in content_lower:
-                    pattern_score += 15
-                    evidence.append(f"Pattern detected: {pattern}")
+        for risk_id, risk_info in ENTERPRISE_AGENTIC_RISKS.items():
+            ai_analysis = ai_analyses[risk_id]
 
-            # Severity indicators
-            severity_score = 0
-            for indicator in risk_info["severity_indicators"]:
-                if indicator in content_lower:
-                    severity_score += 25
-                    evidence.append(f"Critical indicator: {indicator}")
+            # Technical patterns and severity indicators
+            patterns = pattern_hits.get(risk_id, [])
+            indicators = indicator_hits.get(risk_id, [])
+            pattern_score = 15 * len(patterns)
+            severity_score = 25 * len(indicators)
+            evidence = ([f"Pattern detected: {pattern}" for pattern in patterns] +
+                        [f"Critical indicator: {indicator}" for indicator in indicators])
 
             # Combined score (AI + Patterns)
             combined_score = (ai_analysis["score"] * 0.7) + (pattern_score * 0.2) + (severity_score * 0.1)
@@ -614,20 +850,24 @@ class EnterpriseCodeAnalyzer:
 
         return risk_assessments
 
-    async def _ai_risk_analysis(self, content: str, filename: str, risk_info: Dict) -> Dict:
-        """Specific risk analysis with AI"""
+    async def _ai_risk_analysis(self, content: str, filename: str) -> Dict[str, Dict]:
+        """Risk analysis with AI for every enterprise risk in a single request"""
+
+        risk_list = "\n".join(
+            f"- {risk_id}: {risk_info['name']} ({risk_info['category']}) - {risk_info['description']}"
+            for risk_id, risk_info in ENTERPRISE_AGENTIC_RISKS.items()
+        )
 
         prompt = f"""
-        Analyze this code for the specific risk: {risk_info['name']}
+        Analyze this code for each of the following specific risks:
+        {risk_list}
 
-        Risk Description: {risk_info['description']}
-        Category: {risk_info['category']}
         File: {filename}
 
         Code (first 1000 chars):
         {content[:1000]}
 
-        Return a JSON with:
+        Return a JSON object keyed by risk id (e.g. "AGR001"), each value with:
         - score: risk score 0-100
         - evidence: list of specific evidence found
         - technical_details: technical details of the problem
@@ -638,23 +878,36 @@ class EnterpriseCodeAnalyzer:
         """
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=500,
-                temperature=0.1
-            )
+            max_tokens = RISK_ANALYSIS_TOKENS_PER_RISK * len(ENTERPRISE_AGENTIC_RISKS)
+            response = await self._chat_completion(prompt, max_tokens=max_tokens,
+                                                   temperature=0.1, json_response=True)
+            # A reply cut off at the token limit is invalid JSON; say so instead
+            # of reporting it as a generic parse failure
+            if response.choices[0].finish_reason == "length":
+                st.warning(f"⚠️ Risk analysis for {filename} exceeded {max_tokens} tokens and was truncated")
+                raise ValueError(f"Risk analysis response truncated at {max_tokens} tokens")
+            analyses = json.loads(response.choices[0].message.content)
+            if not isinstance(analyses, dict):
+                raise ValueError("Risk analysis response is not a JSON object")
+        except Exception as e:
+            return {risk_id: self._risk_analysis_fallback(str(e)) for risk_id in ENTERPRISE_AGENTIC_RISKS}
 
-            return json.loads(response.choices[0].message.content)
+        # A risk the model skipped falls back on its own without discarding the others
+        return {
+            risk_id: analyses[risk_id] if isinstance(analyses.get(risk_id), dict)
+            else self._risk_analysis_fallback(f"No analysis returned for {risk_id}")
+            for risk_id in ENTERPRISE_AGENTIC_RISKS
+        }
 
-        except Exception as e:
-            return {
-                "score": 30,
-                "evidence": ["AI analysis unavailable"],
-                "technical_details": {"error": str(e)},
-                "recommendations": ["Manual verification"],
-                "severity_justification": "Default score applied"
-            }
+    def _risk_analysis_fallback(self, error: str) -> Dict:
+        """Default risk analysis used when the AI result is unavailable"""
+        return {
+            "score": 30,
+            "evidence": ["AI analysis unavailable"],
+            "technical_details": {"error": error},
+            "recommendations": ["Manual verification"],
+            "severity_justification": "Default score applied"
+        }
 
     async def _deep_security_analysis(self, content: str, filename: str) -> Dict:
         """Deep security analysis with AI"""
@@ -682,12 +935,7 @@ class EnterpriseCodeAnalyzer:
         """
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.1
-            )
+            response = await self._chat_completion(prompt, max_tokens=800, temperature=0.1)
 
             return json.loads(response.choices[0].message.content)
 
@@ -704,12 +952,20 @@ class EnterpriseCodeAnalyzer:
     async def _ai_system_analysis(self, files_data: List[Dict]) -> Dict:
         """Complete system analysis with AI"""
 
-        # Prepare system context
+        # Prepare system context in a single pass over the files
+        file_types = {}
+        classifications = []
+        total_lines = 0
+        for f in files_data:
+            file_types[f["file_type"]] = None
+            classifications.append(f["classification"])
+            total_lines += f["lines_count"]
+
         system_context = {
             "total_files": len(files_data),
-            "file_types": list(set(f["file_type"] for f in files_data)),
-            "classifications": [f["classification"] for f in files_data],
-            "total_lines": sum(f["lines_count"] for f in files_data)
+            "file_types": list(file_types),
+            "classifications": classifications,
+            "total_lines": total_lines
         }
 
         prompt = f"""
@@ -735,12 +991,7 @@ class EnterpriseCodeAnalyzer:
         """
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=1000,
-                temperature=0.2
-            )
+            response = await self._chat_completion(prompt, max_tokens=1000, temperature=0.2)
 
             return json.loads(response.choices[0].message.content)
 
@@ -763,10 +1014,13 @@ class EnterpriseCodeAnalyzer:
         compliance_violations = []
         framework_scores = {}
 
-        for framework, requirements in COMPLIANCE_REQUIREMENTS.items():
+        # Specific analysis per framework, all frameworks checked concurrently
+        framework_violations = await asyncio.gather(*(
+            self._analyze_framework_compliance(files_data, framework, requirements)
+            for framework, requirements in COMPLIANCE_REQUIREMENTS.items()
+        ))
 
-            # Specific analysis per framework
-            violations = await self._analyze_framework_compliance(files_data, framework, requirements)
+        for framework, violations in zip(COMPLIANCE_REQUIREMENTS, framework_violations):
             compliance_violations.extend(violations)
 
             # Score per framework
@@ -787,10 +1041,12 @@ class EnterpriseCodeAnalyzer:
 
         violations = []
 
-        # AI compliance analysis
-        for file_data in files_data:
-            ai_compliance = await self._ai_compliance_check(file_data, framework, requirements)
+        # AI compliance analysis (one request per file, issued together)
+        ai_compliances = await asyncio.gather(*(
+            self._ai_compliance_check(file_data, framework, requirements) for file_data in files_data
+        ))
 
+        for ai_compliance in ai_compliances:
             for violation_data in ai_compliance.get("violations", []):
                 # Ensure severity is a valid RiskLevel enum member
                 severity_str = violation_data.get("severity", "MEDIUM").upper()
@@ -989,12 +1245,7 @@ class EnterpriseCodeAnalyzer:
             prompt = f"Generic compliance analysis for {framework.value} - file {filename}"
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=800,
-                temperature=0.1
-            )
+            response = await self._chat_completion(prompt, max_tokens=800, temperature=0.1)
 
             result = json.loads(response.choices[0].message.content)
 
@@ -1116,37 +1367,34 @@ class EnterpriseCodeAnalyzer:
     async def _analyze_dependencies(self, files_data: List[Dict]) -> List[Dict]:
         """Dependency risk analysis"""
 
-        dependency_risks = []
+        files_with_dependencies = []
 
         for file_data in files_data:
             content = file_data.get("content_preview", "")
 
-            # Search for imports and dependencies
-            import_patterns = [
-                r"import\s+(\w+)",
-                r"from\s+(\w+)\s+import",
-                r"require\s*\(['\"]([^'\"]+)['\"]\)",
-                r"@import\s+['\"]([^'\"]+)['\"]"
-            ]
-
+            # Search for imports and dependencies (literal prefilter skips
+            # the regex when its keyword is absent)
+            content_lower = content.lower()
             dependencies = []
-            for pattern in import_patterns:
-                matches = re.findall(pattern, content, re.IGNORECASE)
-                dependencies.extend(matches)
+            for literal, pattern in IMPORT_PATTERNS:
+                if literal in content_lower:
+                    dependencies.extend(pattern.findall(content))
 
             if dependencies:
-                # AI analysis of dependencies
-                ai_dep_analysis = await self._ai_dependency_analysis(dependencies, file_data["filename"])
-
-                dependency_risks.append({
-                    "file": file_data["filename"],
-                    "dependencies": dependencies[:10],  # Limit to avoid overloading
-                    "risk_score": ai_dep_analysis.get("risk_score", 30),
-                    "critical_dependencies": ai_dep_analysis.get("critical_dependencies", []),
-                    "recommendations": ai_dep_analysis.get("recommendations", [])
-                })
+                files_with_dependencies.append((file_data["filename"], dependencies))
 
-        return dependency_risks
+        # AI analysis of dependencies, one request per file issued together
+        ai_dep_analyses = await asyncio.gather(*(
+            self._ai_dependency_analysis(dependencies, filename) for filename, dependencies in files_with_dependencies
+        ))
+
+        return [{
+            "file": filename,
+            "dependencies": dependencies[:10],  # Limit to avoid overloading
+            "risk_score": ai_dep_analysis.get("risk_score", 30),
+            "critical_dependencies": ai_dep_analysis.get("critical_dependencies", []),
+            "recommendations": ai_dep_analysis.get("recommendations", [])
+        } for (filename, dependencies), ai_dep_analysis in zip(files_with_dependencies, ai_dep_analyses)]
 
     async def _ai_dependency_analysis(self, dependencies: List[str], filename: str) -> Dict:
         """Dependency analysis with AI"""
@@ -1171,12 +1419,7 @@ class EnterpriseCodeAnalyzer:
         """
 
         try:
-            response = self.client.chat.completions.create(
-                model="gpt-4o-mini",
-                messages=[{"role": "user", "content": prompt}],
-                max_tokens=400,
-                temperature=0.1
-            )
+            response = await self._chat_completion(prompt, max_tokens=400, temperature=0.1)
 
             return json.loads(response.choices[0].message.content)
 
@@ -1193,25 +1436,18 @@ class EnterpriseCodeAnalyzer:
         """Calculation of the final enterprise score"""
 
         # Component scores
-        avg_file_score = sum(f["file_score"] for f in files_data) / len(files_data) if files_data else 0
+        avg_file_score = sum(map(itemgetter("file_score"), files_data)) / len(files_data) if files_data else 0
         system_score = system_analysis.get("maintainability_score", 50)
         compliance_score = compliance_analysis.get("overall_compliance_score", 70)
         architecture_score = 100 - cross_analysis.get("system_complexity_score", 30)
 
-        # Component weights
-        weights = {
-            "files": 0.25,
-            "system": 0.25,
-            "compliance": 0.35,  # Higher weight for compliance
-            "architecture": 0.15
-        }
-
         # Weighted final score
+        files_weight, system_weight, compliance_weight, architecture_weight = ENTERPRISE_SCORE_WEIGHTS
         overall_score = (
-            avg_file_score * weights["files"] +
-            system_score * weights["system"] +
-            compliance_score * weights["compliance"] +
-            architecture_score * weights["architecture"]
+            avg_file_score * files_weight +
+            system_score * system_weight +
+            compliance_score * compliance_weight +
+            architecture_score * architecture_weight
         )
 
         # Critical penalties
@@ -1297,19 +1533,13 @@ class EnterpriseCodeAnalyzer:
     # Helper methods (placeholders as their implementation wasn't provided in the original code snippet)
     def _calculate_file_enterprise_score(self, risk_assessments: List[RiskAssessment], security_analysis: Dict, content: str) -> float:
         """Calculates the enterprise score for a single file."""
-        # Risk assessments: lower score means higher risk. Map to score where 100 is best.
-        total_risk_score = sum(ra.score for ra in risk_assessments)
-        avg_risk_score_raw = total_risk_score / len(risk_assessments) if risk_assessments else 100 # If no risks, perfect score
-        avg_risk_score = 100 - avg_risk_score_raw # Invert so 100 is good, 0 is bad for risk assessment
-
-        # Security analysis: security_score 0-100 (0=very secure, 100=very insecure). Invert to 100=secure.
-        security_score = 100 - security_analysis.get("security_score", 50) 
-
-        # Simple weighted average
-        file_score = (avg_risk_score * 0.6) + (security_score * 0.4)
+        # Risk assessments: lower score means higher risk. Inverted so 100 is good, 0 is bad.
+        # Security analysis: security_score 0-100 (0=very secure, 100=very insecure). Inverted to 100=secure.
+        avg_risk_score_raw = sum(ra.score for ra in risk_assessments) / len(risk_assessments) if risk_assessments else 100
+        file_score = (100 - avg_risk_score_raw) * 0.6 + (100 - security_analysis.get("security_score", 50)) * 0.4
         return min(100, max(0, file_score))
 
-    def _extract_critical_blocks(self, lines: List[str]) -> List[str]:
+    def _extract_critical_blocks(self, content: str) -> List[str]:
         """Extracts critical code blocks (placeholder)"""
         # This would involve parsing code for critical functions, security-sensitive areas, etc.
         # For simplicity, returning a placeholder.
@@ -1344,9 +1574,10 @@ class EnterpriseCodeAnalyzer:
 
     def _estimate_compliance_timeline(self, violations: List[ComplianceViolation]) -> Dict:
         """Estimates compliance remediation timeline (placeholder)"""
-        immediate = sum(1 for v in violations if v.severity == RiskLevel.CRITICAL)
-        short_term = sum(1 for v in violations if v.severity == RiskLevel.HIGH)
-        medium_term = sum(1 for v in violations if v.severity == RiskLevel.MEDIUM)
+        severity_counts = Counter(v.severity for v in violations)
+        immediate = severity_counts[RiskLevel.CRITICAL]
+        short_term = severity_counts[RiskLevel.HIGH]
+        medium_term = severity_counts[RiskLevel.MEDIUM]
         
         total_time_estimate = "N/A"
         if immediate > 0:
@@ -1360,12 +1591,9 @@ class EnterpriseCodeAnalyzer:
         
         details = []
         for v in violations:
-            timeline_str = "Immediate" if v.severity == RiskLevel.CRITICAL else \
-                            "Short Term" if v.severity == RiskLevel.HIGH else \
-                            "Medium Term" if v.severity == RiskLevel.MEDIUM else "Long Term"
             details.append({
                 "violation": v.description,
-                "timeline": timeline_str,
+                "timeline": REMEDIATION_TIMELINES.get(v.severity, DEFAULT_REMEDIATION_TIMELINE),
                 "reason": "AI-detected issue",
                 "penalty_risk": v.penalty_risk
             })
@@ -1408,12 +1636,8 @@ class EnterpriseCodeAnalyzer:
 
     def _calculate_risk_distribution(self, files_data: List[Dict]) -> Dict:
         """Calculates risk distribution (placeholder)"""
-        distribution = {level.value: 0 for level in RiskLevel}
-        for file_data in files_data:
-            risk_level = file_data.get('risk_level')
-            if risk_level:
-                distribution[risk_level.value] += 1
-        return distribution
+        level_counts = Counter(map(itemgetter('risk_level'), files_data))
+        return {level.value: level_counts[level] for level in RiskLevel}
 
     def _identify_priority_actions(self, compliance_analysis: Dict, cross_analysis: Dict) -> List[str]:
         """Identifies priority actions (placeholder)"""
@@ -1428,18 +1652,6 @@ class EnterpriseCodeAnalyzer:
             
         return actions if actions else ["No urgent priority actions identified."]
 
-    def _get_file_type(self, extension: str) -> str:
-        """Returns file type based on extension"""
-        type_map = {
-            'py': 'Python', 'js': 'JavaScript', 'ts': 'TypeScript',
-            'java': 'Java', 'cs': 'C#', 'php': 'PHP', 'rb': 'Ruby',
-            'go': 'Go', 'cpp': 'C++', 'c': 'C', 'json': 'JSON',
-            'yaml': 'YAML', 'yml': 'YAML', 'xml': 'XML',
-            'sql': 'SQL', 'md': 'Markdown', 'txt': 'Text',
-            'html': 'HTML', 'css': 'CSS', 'scss': 'SCSS'
-        }
-        return type_map.get(extension, 'Unknown')
-
     def _basic_classification(self, filename: str) -> str:
         """Basic fallback classification"""
         filename_lower = filename.lower()
@@ -1459,10 +1671,28 @@ class EnterpriseCodeAnalyzer:
         else:
             return "business_logic"
 
+@st.cache_resource
+def get_enterprise_analyzer() -> EnterpriseCodeAnalyzer:
+    """Shared analyzer instance, built once per process so its analysis cache
+    outlives sessions; the OpenAI client is looked up on each call"""
+    return EnterpriseCodeAnalyzer()
+
 # Enterprise Report Generator
 class EnterprisePDFGenerator:
     """Enterprise PDF report generator"""
 
+    # Fixed layout of the compliance table, built once instead of per report
+    COMPLIANCE_TABLE_COL_WIDTHS = (120, 60, 80, 80)
+    COMPLIANCE_TABLE_STYLE = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), HexColor('#4a5568')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), HexColor('#ffffff')),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+        ('GRID', (0, 0), (-1, -1), 1, HexColor('#000000'))
+    ])
+
     def generate_enterprise_report(self, analysis_result: Dict) -> bytes:
         """Generates a complete enterprise PDF report"""
         buffer = io.BytesIO()
@@ -1479,6 +1709,11 @@ class EnterprisePDFGenerator:
         # Executive Summary
         story.append(Paragraph("EXECUTIVE SUMMARY", styles['Heading1']))
 
+        # Stamped when the analysis ran, so a cached report never shows its render time
+        analysis_date = analysis_result.get('analysis_date')
+        analysis_date = (datetime.datetime.fromisoformat(analysis_date) if analysis_date
+                         else datetime.datetime.now()).strftime('%d/%m/%Y %H:%M')
+
         executive_summary = f"""
         <b>Overall System Score:</b> {analysis_result['enterprise_score']['overall_score']}/100<br/>
         <b>Risk Level:</b> {analysis_result['risk_level'].value}<br/>
@@ -1486,7 +1721,7 @@ class EnterprisePDFGenerator:
         <b>Total Lines:</b> {analysis_result['total_lines']:,}<br/>
         <b>Compliance Frameworks Checked:</b> {analysis_result['compliance_frameworks_checked']}<br/>
         <b>AI Model Used:</b> {analysis_result['ai_model_used']}<br/>
-        <b>Analysis Date:</b> {datetime.datetime.now().strftime('%d/%m/%Y %H:%M')}<br/>
+        <b>Analysis Date:</b> {analysis_date}<br/>
         """
 
         story.append(Paragraph(executive_summary, styles['Normal']))
@@ -1502,28 +1737,20 @@ class EnterprisePDFGenerator:
                 ['Framework', 'Score', 'Status', 'Critical Violations']
             ]
 
-            for framework, score in compliance.get('framework_scores', {}).items():
-                status = "✅ Compliant" if score >= 80 else "⚠️ Warning" if score >= 60 else "❌ Non-Compliant"
-                critical_count = len([v for v in compliance.get('violations', [])
-                                       if v.framework == framework and v.severity in [RiskLevel.CRITICAL, RiskLevel.HIGH]])
+            # Bucket critical violations by framework in one pass
+            critical_counts = Counter(v.framework for v in compliance.get('violations', [])
+                                      if v.severity in (RiskLevel.CRITICAL, RiskLevel.HIGH))
 
+            for framework, score in compliance.get('framework_scores', {}).items():
                 compliance_table_data.append([
                     framework.value,
                     f"{score:.1f}/100",
-                    status,
-                    str(critical_count)
+                    compliance_status(score),
+                    str(critical_counts[framework])
                 ])
 
-            compliance_table = Table(compliance_table_data, colWidths=[120, 60, 80, 80])
-            compliance_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), HexColor('#4a5568')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), HexColor('#ffffff')),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 0), (-1, -1), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-                ('GRID', (0, 0), (-1, -1), 1, HexColor('#000000'))
-            ]))
+            compliance_table = Table(compliance_table_data, colWidths=self.COMPLIANCE_TABLE_COL_WIDTHS)
+            compliance_table.setStyle(self.COMPLIANCE_TABLE_STYLE)
 
             story.append(compliance_table)
             story.append(Spacer(1, 20))
@@ -1531,33 +1758,27 @@ class EnterprisePDFGenerator:
         # Top Critical Risks
         story.append(Paragraph("TOP 5 CRITICAL RISKS IDENTIFIED", styles['Heading2']))
 
-        # Sort risks by score
-        all_risks = []
-        for file_data in analysis_result.get('files_data', []):
-            for risk in file_data.get('risk_assessments', []):
-                all_risks.append(risk)
-
-        # Sort by remediation priority first, then by risk score (lower priority number means higher priority)
-        # And for risk score, higher score means LOWER risk (so we want lowest score risks first for "critical")
-        top_risks = sorted(all_risks, key=lambda x: (x.remediation_priority, x.score))[:5]
-
+        # Selected once when the analysis finished; older results are ranked here
+        top_risks = analysis_result.get('top_risks')
+        if top_risks is None:
+            top_risks = select_top_risks(analysis_result.get('files_data', []))
 
+        risk_texts = []
         for i, risk in enumerate(top_risks, 1):
-            risk_color = '#7f1d1d' if risk.level == RiskLevel.CRITICAL else '#dc2626' if risk.level == RiskLevel.HIGH else '#f59e0b'
+            risk_color = PDF_RISK_COLORS.get(risk.level, PDF_DEFAULT_RISK_COLOR)
+            evidence_line = f"<b>Evidence:</b> {'; '.join(risk.evidence[:3])}<br/>" if risk.evidence else ""
 
-            risk_text = f"""
+            risk_texts.append(f"""
             <font color='{risk_color}'><b>{i}. {risk.name}</b></font><br/>
             <b>Score:</b> {risk.score:.1f}/100 | <b>Level:</b> {risk.level.value}<br/>
             <b>Category:</b> {risk.category}<br/>
             <b>Priority:</b> {risk.remediation_priority}/5 | <b>Estimated Cost:</b> {risk.estimated_cost}<br/>
             <b>Timeline:</b> {risk.timeline}<br/>
-            """
+            {evidence_line}""")
 
-            if risk.evidence:
-                risk_text += f"<b>Evidence:</b> {'; '.join(risk.evidence[:3])}<br/>"
-
-            story.append(Paragraph(risk_text, styles['Normal']))
-            story.append(Spacer(1, 15))
+        if risk_texts:
+            # One flowable for all risks, like the recommendations below
+            story.append(Paragraph("<br/>".join(risk_texts), styles['Normal']))
 
         # Strategic Recommendations
         story.append(Spacer(1, 20))
@@ -1565,10 +1786,10 @@ class EnterprisePDFGenerator:
 
         if 'system_analysis' in analysis_result:
             recommendations = analysis_result['system_analysis'].get('strategic_recommendations', [])
-            for i, rec in enumerate(recommendations[:5], 1):
-                rec_text = f"<b>{i}.</b> {rec}"
+            if recommendations:
+                # One flowable for the whole list instead of a Paragraph/Spacer pair per item
+                rec_text = "<br/><br/>".join(f"<b>{i}.</b> {rec}" for i, rec in enumerate(recommendations[:5], 1))
                 story.append(Paragraph(rec_text, styles['Normal']))
-                story.append(Spacer(1, 8))
 
         # Methodology
         story.append(Spacer(1, 30))
@@ -1599,17 +1820,25 @@ class EnterprisePDFGenerator:
 
         # Generate PDF
         doc.build(story)
-        buffer.seek(0)
         return buffer.getvalue()
 
+@st.cache_data(show_spinner=False, max_entries=8)
+def render_enterprise_report(analysis_hash: str, _analysis_result: Dict) -> bytes:
+    """Renders the PDF report once per analysis; reruns reuse the cached bytes"""
+    return EnterprisePDFGenerator().generate_enterprise_report(_analysis_result)
+
+def clear_enterprise_analysis():
+    """Button callback: drops the stored analysis before the click's own rerun"""
+    st.session_state.pop('enterprise_analysis', None)
+
 # Main Enterprise Interface
 def main():
     """Main enterprise interface"""
+    st.markdown(ENTERPRISE_CSS, unsafe_allow_html=True)
 
     # Check OpenAI client first
     try:
-        client = get_openai_client()
-        st.session_state.openai_client = client
+        get_openai_client()
     except Exception:
         return  # Error already handled in get_openai_client()
 
@@ -1655,15 +1884,8 @@ def main():
             score = result.get('enterprise_score', {}).get('overall_score', 0)
             risk_level = result.get('risk_level', RiskLevel.MEDIUM)
 
-            # Adjust color logic for risk level (higher score = better)
-            if score >= 80:
-                score_color = "🟢" # Minimal Risk
-            elif score >= 65:
-                score_color = "🟡" # Low Risk
-            elif score >= 40:
-                score_color = "🟠" # Moderate Risk
-            else:
-                score_color = "🔴" # High/Critical Risk
+            # Color by risk level (higher score = better)
+            score_color = score_badge(score)
 
             st.info(f"""
             {score_color} **Score:** {score}/100
@@ -1673,9 +1895,7 @@ def main():
             **AI:** {result.get('ai_model_used', 'N/A')}
             """)
 
-            if st.button("🗑️ Clear Analysis"):
-                del st.session_state.enterprise_analysis
-                st.rerun()
+            st.button("🗑️ Clear Analysis", on_click=clear_enterprise_analysis)
 
     # Page routing
     if page == "🔍 Enterprise Analysis":
@@ -1698,9 +1918,7 @@ def show_enterprise_analysis_page():
     if 'enterprise_analysis' in st.session_state:
         col1, col2 = st.columns([1, 3])
         with col1:
-            if st.button("🔄 New Enterprise Analysis", type="secondary"):
-                del st.session_state.enterprise_analysis
-                st.rerun()
+            st.button("🔄 New Enterprise Analysis", type="secondary", on_click=clear_enterprise_analysis)
         with col2:
             st.success("✅ **Enterprise Analysis completed** - Detailed results below")
 
@@ -1725,7 +1943,8 @@ def show_enterprise_analysis_page():
         accept_multiple_files=True,
         type=['py', 'js', 'ts', 'java', 'cs', 'php', 'rb', 'go', 'cpp', 'c',
               'json', 'yaml', 'yml', 'xml', 'sql', 'md', 'txt', 'html', 'css'],
-        help="All types of code, configuration, and documentation files"
+        help=f"All types of code, configuration, and documentation files. "
+             f"Files over {MAX_FILE_BYTES // (1024 * 1024)} MB are skipped."
     )
 
     if uploaded_files:
@@ -1736,9 +1955,7 @@ def show_enterprise_analysis_page():
             total_size = 0
 
             for file in uploaded_files:
-                file_ext = os.path.splitext(file.name.lower())[1][1:]
-                analyzer = EnterpriseCodeAnalyzer(st.session_state.openai_client) # Analyzer instance for helper methods
-                file_type = analyzer._get_file_type(file_ext)
+                _, file_type = classify_filename(file.name)
                 total_size += file.size
 
                 col1, col2, col3 = st.columns([3, 1, 1])
@@ -1758,12 +1975,11 @@ def show_enterprise_analysis_page():
             # A more direct way is to run the async analysis function directly if possible,
             # or use st.status for better UI feedback during long operations.
 
-            analyzer = EnterpriseCodeAnalyzer(st.session_state.openai_client)
+            analyzer = get_enterprise_analyzer()
             
             # Using st.status for better progress feedback
             with st.status("🔄 Executing complete enterprise analysis...", expanded=True) as status:
                 st.write("🤖 Initializing AI analysis...")
-                time.sleep(0.5) # Simulate work
 
                 # Run the async function. Since Streamlit runs on a single thread,
                 # we need to block for the async operations. asyncio.run() does this.
@@ -1787,12 +2003,10 @@ def show_enterprise_analysis_page():
                     else:
                         status.update(label=f"❌ Analysis failed unexpectedly: {str(e)}", state="error", expanded=False)
                     # Clear session state if analysis failed to allow retry
-                    if 'enterprise_analysis' in st.session_state:
-                        del st.session_state.enterprise_analysis
+                    st.session_state.pop('enterprise_analysis', None)
                 except Exception as e:
                     status.update(label=f"❌ Analysis failed: {str(e)}", state="error", expanded=False)
-                    if 'enterprise_analysis' in st.session_state:
-                        del st.session_state.enterprise_analysis
+                    st.session_state.pop('enterprise_analysis', None)
 
 
 def show_executive_dashboard():
@@ -1837,18 +2051,20 @@ def show_executive_dashboard():
         
     st.subheader("Strategic Recommendations")
     if 'system_analysis' in analysis_result:
-        for rec in analysis_result['system_analysis'].get('strategic_recommendations', []):
-            st.markdown(f"- {rec}")
-
-    if st.button("Download Executive Report (PDF)", type="primary"):
-        pdf_generator = EnterprisePDFGenerator()
-        pdf_bytes = pdf_generator.generate_enterprise_report(analysis_result)
-        st.download_button(
-            label="Download PDF Report",
-            data=pdf_bytes,
-            file_name="AgentRisk_Pro_Enterprise_Report.pdf",
-            mime="application/pdf"
-        )
+        recommendations = analysis_result['system_analysis'].get('strategic_recommendations', [])
+        if recommendations:
+            st.markdown("\n".join(f"- {rec}" for rec in recommendations))
+
+    # The report is only rendered when the download is clicked (and then cached per analysis);
+    # downloading changes nothing on the page, so it does not rerun the script
+    st.download_button(
+        label="Download Executive Report (PDF)",
+        data=functools.partial(render_enterprise_report, analysis_result.get('analysis_hash', ''), analysis_result),
+        file_name="AgentRisk_Pro_Enterprise_Report.pdf",
+        mime="application/pdf",
+        type="primary",
+        on_click="ignore"
+    )
 
 
 def show_compliance_center():
@@ -1871,10 +2087,9 @@ def show_compliance_center():
     st.subheader("Compliance Violations")
     violations = compliance.get('violations', [])
     if violations:
-        for violation in violations:
-            severity_class = f"compliance-{violation.severity.name.lower()}"
-            st.markdown(f"""
-            <div class="risk-card-enterprise {severity_class}">
+        # All cards go to the frontend as one markdown element
+        st.markdown("".join(f"""
+            <div class="risk-card-enterprise compliance-{violation.severity.name.lower()}">
                 <b>Framework:</b> {violation.framework.value}<br/>
                 <b>Article:</b> {violation.article}<br/>
                 <b>Description:</b> {violation.description}<br/>
@@ -1883,7 +2098,7 @@ def show_compliance_center():
                 <b>Evidence:</b> {'; '.join(violation.evidence)}<br/>
                 <b>Remediation:</b> {'; '.join(violation.remediation)}
             </div>
-            """, unsafe_allow_html=True)
+            """ for violation in violations), unsafe_allow_html=True)
     else:
         st.info("🎉 No compliance violations detected!")
 
@@ -1907,21 +2122,12 @@ def show_compliance_center():
             reason = detail.get('reason', 'N/A')
             penalty = detail.get('penalty_risk', 'N/A')
 
-            # Emoji based on urgency
-            if "Immediate" in timeline:
-                emoji = "🔴"
-                alert_type = "error"
-            elif "Short" in timeline:
-                emoji = "🟡"
-                alert_type = "warning"
-            else:
-                emoji = "🟢"
-                alert_type = "info"
+            emoji = TIMELINE_EMOJIS.get(timeline, DEFAULT_TIMELINE_EMOJI)
 
             with st.expander(f"{emoji} {violation} - {timeline}"):
-                st.markdown(f"**Reason:** {reason}")
-                st.markdown(f"**Penalty Risk:** {penalty}")
-                st.write(f"Further details for {violation}") # Add more details if available
+                st.markdown(f"**Reason:** {reason}\n\n"
+                            f"**Penalty Risk:** {penalty}\n\n"
+                            f"Further details for {violation}")  # Add more details if available
 
 def show_architecture_analysis():
     """Architecture & Dependencies page"""
@@ -1941,9 +2147,9 @@ def show_architecture_analysis():
     if dependency_risks:
         for dr in dependency_risks:
             with st.expander(f"File: {dr.get('file', 'N/A')} - Risk Score: {dr.get('risk_score', 'N/A')}"):
-                st.markdown(f"**Dependencies:** {', '.join(dr.get('dependencies', []))}")
-                st.markdown(f"**Critical Dependencies:** {', '.join(dr.get('critical_dependencies', []))}")
-                st.markdown(f"**Recommendations:** {'; '.join(dr.get('recommendations', []))}")
+                st.markdown(f"**Dependencies:** {', '.join(dr.get('dependencies', []))}\n\n"
+                            f"**Critical Dependencies:** {', '.join(dr.get('critical_dependencies', []))}\n\n"
+                            f"**Recommendations:** {'; '.join(dr.get('recommendations', []))}")
     else:
         st.info("No significant dependency risks detected.")
 
@@ -1958,8 +2164,7 @@ def show_architecture_analysis():
     st.subheader("Architectural Recommendations")
     arch_recs = cross_analysis.get('architectural_recommendations', [])
     if arch_recs:
-        for rec in arch_recs:
-            st.markdown(f"- {rec}")
+        st.markdown("\n".join(f"- {rec}" for rec in arch_recs))
     else:
         st.info("No specific architectural recommendations at this time.")
 
@@ -1999,44 +2204,7 @@ def show_enterprise_results(analysis_result: Dict):
     st.info(f"Analyzed **{analysis_result['files_analyzed']} files** with a total of **{analysis_result['total_lines']:,} lines of code.**")
     
     with st.expander("Detailed File Analysis"):
-        for file_data in analysis_result.get('files_data', []):
-            st.markdown(f"#### 📄 {file_data['filename']} ({file_data['file_type']})")
-            st.write(f"Lines: {file_data['lines_count']} | Chars: {file_data['char_count']}")
-            st.write(f"File Score: {file_data['file_score']:.1f}/100 | Risk Level: {file_data['risk_level'].value}")
-            # Ensure classification is JSON serializable
-            try:
-                st.json(file_data['classification'])
-            except TypeError:
-                st.write("Classification data not displayable as JSON.")
-                st.write(file_data['classification'])
-
-            if file_data.get('ai_insights'):
-                st.write(f"AI Insights: {file_data['ai_insights'].get('summary', 'N/A')}")
-            
-            if file_data.get('risk_assessments'):
-                st.markdown("##### Detected Risks:")
-                for risk_assessment in file_data['risk_assessments']:
-                    severity_class = f"risk-{risk_assessment.level.name.lower()}"
-                    # Ensure technical_details is JSON serializable
-                    tech_details_str = ""
-                    try:
-                        tech_details_str = json.dumps(risk_assessment.technical_details, indent=2)
-                    except TypeError:
-                        tech_details_str = str(risk_assessment.technical_details) # Fallback to string if not serializable
-
-                    st.markdown(f"""
-                    <div class="risk-card-enterprise {severity_class}">
-                        <b>Risk ID:</b> {risk_assessment.risk_id}<br/>
-                        <b>Name:</b> {risk_assessment.name}<br/>
-                        <b>Category:</b> {risk_assessment.category}<br/>
-                        <b>Score:</b> {risk_assessment.score:.1f}/100 | <b>Level:</b> {risk_assessment.level.value}<br/>
-                        <b>Priority:</b> {risk_assessment.remediation_priority}/5 | <b>Cost:</b> {risk_assessment.estimated_cost}<br/>
-                        <b>Timeline:</b> {risk_assessment.timeline}<br/>
-                        <b>Evidence:</b> {'; '.join(risk_assessment.evidence[:2])}...<br/>
-                        <b>Technical Details:</b> <div class="technical-detail">{tech_details_str}</div>
-                    </div>
-                    """, unsafe_allow_html=True)
-            st.markdown("---")
+        show_file_details(analysis_result.get('files_data', []))
 
     # System Analysis
     st.subheader("🤖 System-Wide Analysis")
@@ -2051,17 +2219,15 @@ def show_enterprise_results(analysis_result: Dict):
     
     if compliance.get('violations'):
         with st.expander("View All Compliance Violations"):
-            for violation in compliance['violations']:
-                severity_class = f"compliance-{violation.severity.name.lower()}"
-                st.markdown(f"""
-                <div class="risk-card-enterprise {severity_class}">
+            st.markdown("".join(f"""
+                <div class="risk-card-enterprise compliance-{violation.severity.name.lower()}">
                     <b>Framework:</b> {violation.framework.value}<br/>
                     <b>Article:</b> {violation.article}<br/>
                     <b>Description:</b> {violation.description}<br/>
                     <b>Severity:</b> {violation.severity.value}<br/>
                     <b>Penalty Risk:</b> {violation.penalty_risk}<br/>
                 </div>
-                """, unsafe_allow_html=True)
+                """ for violation in compliance['violations']), unsafe_allow_html=True)
 
     # Remediation Timeline
     st.subheader("⏰ Detailed Remediation Timeline")
@@ -2090,17 +2256,10 @@ def show_enterprise_results(analysis_result: Dict):
                 reason = detail.get('reason', 'N/A')
                 penalty = detail.get('penalty_risk', 'N/A')
 
-                # Emoji based on urgency
-                if "Immediate" in timeline:
-                    emoji = "🔴"
-                elif "Short" in timeline:
-                    emoji = "🟡"
-                else:
-                    emoji = "🟢"
+                emoji = TIMELINE_EMOJIS.get(timeline, DEFAULT_TIMELINE_EMOJI)
 
                 with st.expander(f"{emoji} {violation} - {timeline}"):
-                    st.markdown(f"**Reason:** {reason}")
-                    st.markdown(f"**Penalty Risk:** {penalty}")
+                    st.markdown(f"**Reason:** {reason}\n\n**Penalty Risk:** {penalty}")
         else:
             st.info("No remediation timeline details available.")
 
@@ -2109,6 +2268,58 @@ def show_enterprise_results(analysis_result: Dict):
     cross_analysis = analysis_result.get('cross_analysis', {})
     st.json(cross_analysis)
 
+@st.fragment
+def show_file_details(files_data: List[Dict]):
+    """Per-file detail cards, paginated; paging reruns only this fragment"""
+    page_count = max(1, -(-len(files_data) // FILE_DETAILS_PAGE_SIZE))
+    page = 1
+    if page_count > 1:
+        page = st.number_input(f"Page (of {page_count})", min_value=1, max_value=page_count, value=1, step=1)
+    first = (page - 1) * FILE_DETAILS_PAGE_SIZE
+
+    for file_data in files_data[first:first + FILE_DETAILS_PAGE_SIZE]:
+        # Heading and summary lines in one element
+        st.markdown(f"#### 📄 {file_data['filename']} ({file_data['file_type']})\n\n"
+                    f"Lines: {file_data['lines_count']} | Chars: {file_data['char_count']}\n\n"
+                    f"File Score: {file_data['file_score']:.1f}/100 | Risk Level: {file_data['risk_level'].value}")
+        # Ensure classification is JSON serializable
+        try:
+            st.json(file_data['classification'])
+        except TypeError:
+            st.write("Classification data not displayable as JSON.")
+            st.write(file_data['classification'])
+
+        if file_data.get('ai_insights'):
+            st.write(f"AI Insights: {file_data['ai_insights'].get('summary', 'N/A')}")
+
+        if file_data.get('risk_assessments'):
+            st.markdown("##### Detected Risks:")
+            # Collect the file's risk cards and send them as one markdown element
+            risk_cards = []
+            for risk_assessment in file_data['risk_assessments']:
+                severity_class = f"risk-{risk_assessment.level.name.lower()}"
+                # Ensure technical_details is JSON serializable
+                tech_details_str = ""
+                try:
+                    tech_details_str = json.dumps(risk_assessment.technical_details, indent=2)
+                except TypeError:
+                    tech_details_str = str(risk_assessment.technical_details) # Fallback to string if not serializable
+
+                risk_cards.append(f"""
+                <div class="risk-card-enterprise {severity_class}">
+                    <b>Risk ID:</b> {risk_assessment.risk_id}<br/>
+                    <b>Name:</b> {risk_assessment.name}<br/>
+                    <b>Category:</b> {risk_assessment.category}<br/>
+                    <b>Score:</b> {risk_assessment.score:.1f}/100 | <b>Level:</b> {risk_assessment.level.value}<br/>
+                    <b>Priority:</b> {risk_assessment.remediation_priority}/5 | <b>Cost:</b> {risk_assessment.estimated_cost}<br/>
+                    <b>Timeline:</b> {risk_assessment.timeline}<br/>
+                    <b>Evidence:</b> {'; '.join(risk_assessment.evidence[:2])}...<br/>
+                    <b>Technical Details:</b> <div class="technical-detail">{tech_details_str}</div>
+                </div>
+                """)
+            st.markdown("".join(risk_cards), unsafe_allow_html=True)
+        st.markdown("---")
+
 # Entry point
 if __name__ == "__main__":
     main()